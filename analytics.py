@@ -0,0 +1,249 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+import logging
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import ANALYTICS_BATCH_SIZE, ANALYTICS_SETTLE_SECONDS
+from enums import OrderStatus
+from models import AnalyticsWatermark, Order, StatusHistory, TransitionDuration
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "transition_durations"
+# advisory lock key for the refresh job, distinct from the archive job's keys
+REFRESH_LOCK_KEY = 7261003
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+# ---------------- ROLLUP REFRESH ----------------
+def get_watermark(db: Session) -> AnalyticsWatermark:
+    """Lock and return the rollup watermark row, creating it on first use."""
+    watermark = (
+        db.query(AnalyticsWatermark)
+        .filter(AnalyticsWatermark.name == WATERMARK_NAME)
+        .with_for_update()
+        .first()
+    )
+    if watermark:
+        return watermark
+
+    try:
+        db.add(AnalyticsWatermark(name=WATERMARK_NAME, last_history_id=0))
+        db.commit()
+    except IntegrityError:
+        # another worker created it first
+        db.rollback()
+
+    return (
+        db.query(AnalyticsWatermark)
+        .filter(AnalyticsWatermark.name == WATERMARK_NAME)
+        .with_for_update()
+        .one()
+    )
+
+
+def refresh_batch(db: Session, settled_before: datetime, batch_size: int = ANALYTICS_BATCH_SIZE) -> int:
+    """Roll up the next batch of settled history rows past the watermark. Returns rows covered."""
+    try:
+        watermark = get_watermark(db)
+        last_id = watermark.last_history_id
+
+        # ids come from a sequence before commit, so only rows older than the settle
+        # window are trusted to have every lower id already committed
+        pending = (
+            select(StatusHistory.id)
+            .where(StatusHistory.id > last_id, StatusHistory.timestamp < settled_before)
+            .order_by(StatusHistory.id)
+            .limit(batch_size)
+            .subquery()
+        )
+        upper, covered = db.execute(select(func.max(pending.c.id), func.count())).one()
+
+        if not covered:
+            db.commit()
+            return 0
+
+        # transitions are recomputed for every order touched by the batch, so a row
+        # that lands between existing ones also fixes its successor's duration
+        touched = (
+            select(StatusHistory.order_id)
+            .where(StatusHistory.id > last_id, StatusHistory.id <= upper)
+            .distinct()
+        )
+        db.execute(delete(TransitionDuration).where(TransitionDuration.order_id.in_(touched)))
+
+        rows = (
+            select(
+                StatusHistory.id,
+                StatusHistory.order_id,
+                StatusHistory.status,
+                StatusHistory.timestamp,
+                func.lag(StatusHistory.status).over(
+                    partition_by=StatusHistory.order_id,
+                    order_by=(StatusHistory.timestamp, StatusHistory.id),
+                ).label("prev_status"),
+            )
+            .where(
+                StatusHistory.order_id.in_(touched),
+                StatusHistory.id <= upper,
+                StatusHistory.timestamp.isnot(None),
+            )
+            .subquery()
+        )
+        # drop repeated statuses (the delivery endpoint writes them) so durations
+        # are measured from when the order first entered the previous status
+        entered = (
+            select(rows)
+            .where(rows.c.status.is_distinct_from(rows.c.prev_status))
+            .subquery()
+        )
+        window = {
+            "partition_by": entered.c.order_id,
+            "order_by": (entered.c.timestamp, entered.c.id),
+        }
+        steps = (
+            select(
+                entered.c.id,
+                entered.c.order_id,
+                entered.c.status,
+                entered.c.timestamp,
+                func.lag(entered.c.status).over(**window).label("from_status"),
+                func.lag(entered.c.timestamp).over(**window).label("from_timestamp"),
+                func.first_value(entered.c.timestamp).over(**window).label("created_timestamp"),
+            )
+            .subquery()
+        )
+
+        db.execute(
+            insert(TransitionDuration).from_select(
+                [
+                    "history_id",
+                    "order_id",
+                    "merchant_name",
+                    "from_status",
+                    "to_status",
+                    "day",
+                    "duration_seconds",
+                    "since_created_seconds",
+                ],
+                select(
+                    steps.c.id,
+                    steps.c.order_id,
+                    Order.merchant_name,
+                    steps.c.from_status,
+                    steps.c.status,
+                    func.date(steps.c.timestamp),
+                    func.extract("epoch", steps.c.timestamp - steps.c.from_timestamp),
+                    func.extract("epoch", steps.c.timestamp - steps.c.created_timestamp),
+                )
+                .join(Order, Order.order_id == steps.c.order_id)
+                .where(steps.c.from_status.isnot(None)),
+            )
+        )
+
+        watermark.last_history_id = upper
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return covered
+
+
+def refresh_transition_durations(db: Session) -> int:
+    """Roll up settled status_history rows past the watermark, batch by batch."""
+    settled_before = datetime.utcnow() - timedelta(seconds=ANALYTICS_SETTLE_SECONDS)
+    total = 0
+    while True:
+        covered = refresh_batch(db, settled_before)
+        if not covered:
+            break
+        total += covered
+
+    if total:
+        logger.info(f"Rolled up {total} status history rows")
+    return total
+
+
+# ---------------- QUERIES ----------------
+GROUP_COLUMNS = {
+    "merchant": TransitionDuration.merchant_name,
+    "day": TransitionDuration.day,
+}
+
+
+def percentile_rows(db: Session, value, group_columns: list, filters: list):
+    """count and PERCENTILES of value, grouped by the given columns."""
+    return db.execute(
+        select(
+            *group_columns,
+            func.count().label("count"),
+            *[
+                func.percentile_cont(q).within_group(value).label(name)
+                for name, q in PERCENTILES.items()
+            ],
+        )
+        .where(*filters)
+        .group_by(*group_columns)
+        .order_by(*group_columns)
+    ).all()
+
+
+def duration_percentiles(
+    db: Session,
+    group_by: list[str],
+    merchant: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+) -> dict:
+    """p50/p90/p99 durations in seconds, grouped by any of GROUP_COLUMNS.
+
+    "transitions" covers each step between consecutive statuses, "since_created"
+    the time from the order's first status to each later one (e.g. created->delivered).
+    """
+    keys = [GROUP_COLUMNS[name].label(name) for name in group_by]
+
+    filters = []
+    if merchant:
+        filters.append(TransitionDuration.merchant_name == merchant)
+    if from_date:
+        filters.append(TransitionDuration.day >= from_date)
+    if to_date:
+        filters.append(TransitionDuration.day <= to_date)
+
+    steps = percentile_rows(
+        db,
+        TransitionDuration.duration_seconds,
+        [*keys, TransitionDuration.from_status, TransitionDuration.to_status],
+        filters,
+    )
+    since_created = percentile_rows(
+        db,
+        TransitionDuration.since_created_seconds,
+        [*keys, TransitionDuration.to_status],
+        filters,
+    )
+
+    return {
+        "transitions": [
+            {
+                **{name: getattr(row, name) for name in group_by},
+                "transition": f"{row.from_status}->{row.to_status}",
+                "count": row.count,
+                **{name: getattr(row, name) for name in PERCENTILES},
+            }
+            for row in steps
+        ],
+        "since_created": [
+            {
+                **{name: getattr(row, name) for name in group_by},
+                "transition": f"{OrderStatus.CREATED.value}->{row.to_status}",
+                "count": row.count,
+                **{name: getattr(row, name) for name in PERCENTILES},
+            }
+            for row in since_created
+        ],
+    }
@@ -0,0 +1,206 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import logging
+
+from sqlalchemy import Connection, DateTime, delete, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from enums import OrderStatus
+from analytics import WATERMARK_NAME
+from models import AnalyticsWatermark, ArchivedOrder, ArchivedStatusHistory, Order, StatusHistory
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = [OrderStatus.DELIVERED.value, OrderStatus.CANCELLED.value]
+
+ORDER_COLUMNS = [
+    "id",
+    "order_id",
+    "product_name",
+    "customer_name",
+    "customer_contact",
+    "customer_address",
+    "merchant_name",
+    "current_status",
+    "created_at",
+    "updated_at",
+]
+HISTORY_COLUMNS = ["id", "timestamp", "order_id", "status", "updated_by", "source"]
+# slack for history rows stamped by a worker whose clock is behind the one that created the order
+HISTORY_CLOCK_SKEW = timedelta(minutes=5)
+
+
+# ---------------- LOOKUPS ----------------
+def find_order(db: Session, order_id: str):
+    """Return the live order, falling back to the archive. None if neither has it."""
+    order = db.query(Order).filter(Order.order_id == order_id).first()
+    if order:
+        return order
+    return db.query(ArchivedOrder).filter(ArchivedOrder.order_id == order_id).first()
+
+
+def find_history(db: Session, order):
+    """Return the status history rows for an order found by find_order."""
+    if not isinstance(order, ArchivedOrder):
+        return (
+            db.query(StatusHistory)
+            .filter(StatusHistory.order_id == order.order_id)
+            .order_by(StatusHistory.timestamp.asc())
+            .all()
+        )
+
+    query = db.query(ArchivedStatusHistory).filter(ArchivedStatusHistory.order_id == order.order_id)
+    # bound the timestamp so Postgres only scans the partitions the order's lifetime spans;
+    # every history row is written after created_at and archived by archived_at
+    if order.created_at:
+        query = query.filter(ArchivedStatusHistory.timestamp >= order.created_at - HISTORY_CLOCK_SKEW)
+    if order.archived_at:
+        query = query.filter(ArchivedStatusHistory.timestamp <= order.archived_at)
+    return query.order_by(ArchivedStatusHistory.timestamp.asc()).all()
+
+
+# ---------------- LOCKS ----------------
+# Advisory lock keys, so several app workers don't run the job or DDL at once.
+JOB_LOCK_KEY = 7261001
+PARTITION_LOCK_KEY = 7261002
+
+
+@contextmanager
+def job_lock(conn: Connection, key: int = JOB_LOCK_KEY):
+    """Hold a session-level advisory lock on conn; yields False if another worker has it."""
+    if conn.dialect.name != "postgresql":
+        yield True
+        return
+
+    locked = conn.execute(select(func.pg_try_advisory_lock(key))).scalar()
+    conn.commit()
+    try:
+        yield locked
+    finally:
+        if locked:
+            conn.execute(select(func.pg_advisory_unlock(key)))
+            conn.commit()
+
+
+# ---------------- PARTITIONS ----------------
+def ensure_history_partitions(db: Session, cutoff: datetime):
+    """Create the monthly archive partitions this run will need, in their own transaction (Postgres only)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+
+    months = set(db.execute(
+        select(func.distinct(func.date_trunc("month", StatusHistory.timestamp)))
+        .join(Order, Order.order_id == StatusHistory.order_id)
+        .where(
+            Order.current_status.in_(TERMINAL_STATUSES),
+            Order.updated_at < cutoff,
+            StatusHistory.timestamp.isnot(None),
+        )
+    ).scalars().all())
+    # rows without a timestamp are archived with utcnow(); also create next month ahead of time
+    now = datetime.utcnow()
+    months.update({now, now.replace(day=1) + timedelta(days=32)})
+
+    try:
+        db.execute(select(func.pg_advisory_xact_lock(PARTITION_LOCK_KEY)))
+        for month in sorted(months):
+            start = month.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            end = (start + timedelta(days=32)).replace(day=1)
+            name = f"{ArchivedStatusHistory.__tablename__}_{start:%Y_%m}"
+            # skip existing partitions so the parent table is only locked when one is missing
+            if db.execute(select(func.to_regclass(name))).scalar():
+                continue
+            db.execute(text(
+                f"CREATE TABLE {name} "
+                f"PARTITION OF {ArchivedStatusHistory.__tablename__} "
+                f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+# ---------------- ARCHIVAL JOB ----------------
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move one batch of terminal orders last updated before cutoff into the archive tables."""
+    # the duration rollup only reads status_history, so orders with history rows past
+    # its watermark must stay live until they are rolled up
+    rolled_up = (
+        select(func.coalesce(func.max(AnalyticsWatermark.last_history_id), 0))
+        .where(AnalyticsWatermark.name == WATERMARK_NAME)
+        .scalar_subquery()
+    )
+    not_rolled_up = (
+        select(StatusHistory.id)
+        .where(StatusHistory.order_id == Order.order_id, StatusHistory.id > rolled_up)
+        .exists()
+    )
+    order_ids = db.execute(
+        select(Order.order_id)
+        .where(
+            Order.current_status.in_(TERMINAL_STATUSES),
+            Order.updated_at < cutoff,
+            ~not_rolled_up,
+        )
+        .order_by(Order.updated_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    if not order_ids:
+        return 0
+
+    # one UTC clock for archived_at and missing history timestamps, matching the
+    # months ensure_history_partitions created
+    archived_at = datetime.utcnow()
+
+    db.execute(
+        insert(ArchivedOrder).from_select(
+            ORDER_COLUMNS + ["archived_at"],
+            select(
+                *[getattr(Order, c) for c in ORDER_COLUMNS],
+                literal(archived_at, DateTime),
+            ).where(Order.order_id.in_(order_ids)),
+        )
+    )
+    db.execute(
+        insert(ArchivedStatusHistory).from_select(
+            HISTORY_COLUMNS,
+            select(
+                StatusHistory.id,
+                func.coalesce(StatusHistory.timestamp, literal(archived_at, DateTime)),
+                StatusHistory.order_id,
+                StatusHistory.status,
+                StatusHistory.updated_by,
+                StatusHistory.source,
+            ).where(StatusHistory.order_id.in_(order_ids)),
+        )
+    )
+    db.execute(delete(StatusHistory).where(StatusHistory.order_id.in_(order_ids)))
+    db.execute(delete(Order).where(Order.order_id.in_(order_ids)))
+    db.commit()
+
+    return len(order_ids)
+
+
+def archive_completed_orders(db: Session, older_than_days: int = ARCHIVE_AFTER_DAYS) -> int:
+    """Archive all terminal orders older than the given number of days, batch by batch."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    ensure_history_partitions(db, cutoff)
+
+    total = 0
+    try:
+        while True:
+            moved = archive_batch(db, cutoff)
+            if not moved:
+                break
+            total += moved
+    except Exception:
+        db.rollback()
+        raise
+
+    if total:
+        logger.info(f"Archived {total} completed orders older than {older_than_days} days")
+    return total
@@ -99,6 +99,19 @@ engine = create_engine(DATABASE_URL, echo=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# ---------------- ARCHIVAL ----------------
+# Delivered/cancelled orders older than this are moved to the archive tables.
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_MINUTES = int(os.getenv("ARCHIVE_INTERVAL_MINUTES", "60"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# ---------------- ANALYTICS ----------------
+# History rows younger than this are left for the next refresh, so rows whose
+# transactions have not committed yet are never skipped by the watermark.
+ANALYTICS_SETTLE_SECONDS = int(os.getenv("ANALYTICS_SETTLE_SECONDS", "300"))
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "5000"))
+ANALYTICS_REFRESH_MINUTES = int(os.getenv("ANALYTICS_REFRESH_MINUTES", "5"))
+
 # ---------------- SECURITY ----------------
 DELIVERY_API_KEY = os.getenv("DELIVERY_API_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -18,6 +18,11 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from config import engine
 from models import Base
+from config import ANALYTICS_REFRESH_MINUTES, ARCHIVE_INTERVAL_MINUTES
+from archive import JOB_LOCK_KEY, archive_completed_orders, find_history, find_order, job_lock
+from analytics import REFRESH_LOCK_KEY, duration_percentiles, refresh_transition_durations
+from datetime import date
+import asyncio
 
 
 logging.basicConfig(level=logging.INFO)
@@ -42,10 +47,39 @@ def get_db():
         db.close()
 
 
+def run_locked(job, lock_key):
+    # the advisory lock lives on this connection, so the session must reuse it
+    with engine.connect() as conn, job_lock(conn, lock_key) as locked:
+        if not locked:
+            return 0
+        db = SessionLocal(bind=conn)
+        try:
+            return job(db)
+        finally:
+            db.close()
+
+async def run_periodically(job, lock_key, interval_minutes):
+    while True:
+        try:
+            await asyncio.to_thread(run_locked, job, lock_key)
+        except Exception as exc:
+            logger.error(f"{job.__name__} failed: {exc}")
+        await asyncio.sleep(interval_minutes * 60)
+
+
 app = FastAPI()
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     Base.metadata.create_all(bind=engine)
+    app.state.background_tasks = [
+        asyncio.create_task(run_periodically(archive_completed_orders, JOB_LOCK_KEY, ARCHIVE_INTERVAL_MINUTES)),
+        asyncio.create_task(run_periodically(refresh_transition_durations, REFRESH_LOCK_KEY, ANALYTICS_REFRESH_MINUTES)),
+    ]
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in app.state.background_tasks:
+        task.cancel()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  
@@ -66,7 +100,7 @@ async def sqlalchemy_exception_handler(request, exc):
 async def create_order(order: OrderCreate,user=Depends(get_current_user), db: Session = Depends(get_db)):
     if user["role"] != "merchant":
         raise HTTPException(status_code=403, detail="Only merchants can create orders")
-    existing_order = db.query(Order).filter(Order.order_id == order.order_id).first()
+    existing_order = find_order(db, order.order_id)
     if existing_order:
         raise HTTPException(status_code=400, detail="Order ID already exist!")
 
@@ -173,7 +207,7 @@ def get_orders(
 
 @app.get("/orders/{order_id}", response_model=dict)
 def get_order(order_id: str = Path(..., description="The ID of the order to retrieve"),user=Depends(get_current_user), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.order_id == order_id).first()
+    order = find_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
@@ -196,18 +230,13 @@ def get_order(order_id: str = Path(..., description="The ID of the order to retr
 @app.get("/orders/{order_id}/history")
 def get_order_history(order_id: str,user=Depends(get_current_user), db: Session = Depends(get_db)):
  
-    order = db.query(Order).filter(Order.order_id == order_id).first()
+    order = find_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if user["role"] == "merchant" and order.merchant_name != user["sub"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    history = (
-        db.query(StatusHistory)
-        .filter(StatusHistory.order_id == order_id)
-        .order_by(StatusHistory.timestamp.asc())
-        .all()
-    )
+    history = find_history(db, order)
 
     if not history:
         return {"order_id": order_id, "history": []}
@@ -378,6 +407,32 @@ async def delivery_update_status(
     return {"message": "Status updated by delivery"}
 
 
+@app.get("/analytics/durations")
+def get_duration_analytics(
+    group_by: str = Query(
+        "merchant",
+        pattern="^(merchant|day)(,(merchant|day))?$",
+        description="merchant, day, or merchant,day"
+    ),
+    merchant: Optional[str] = Query(None),
+    from_date: Optional[date] = Query(None, description="YYYY-MM-DD"),
+    to_date: Optional[date] = Query(None, description="YYYY-MM-DD"),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    if user["role"] == "merchant":
+        merchant = user["sub"]
+
+    group_columns = list(dict.fromkeys(group_by.split(",")))
+    results = duration_percentiles(db, group_columns, merchant, from_date, to_date)
+
+    return {
+        "group_by": group_columns,
+        "transitions": results["transitions"],
+        "since_created": results["since_created"]
+    }
+
+
 @app.get("/order-statuses")
 def get_order_statuses(user=Depends(get_current_user)):
     return {
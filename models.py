@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, ForeignKey, Index
 from datetime import datetime
 from config import Base
 
@@ -38,4 +38,63 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, nullable=False, index=True)
     password = Column(String(200), nullable=False)
-    role = Column(String(20), nullable=False)
\ No newline at end of file
+    role = Column(String(20), nullable=False)
+
+
+# ---------------- ARCHIVE ----------------
+# Terminal orders are moved here by archive.py so the hot tables stay small.
+# On Postgres the history archive is range-partitioned by month on timestamp.
+class ArchivedOrder(Base):
+    __tablename__ = "archived_orders"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(String(50), unique=True, nullable=False, index=True)
+    product_name = Column(String(100), nullable=False)
+    customer_name = Column(String(100), nullable=False)
+    customer_contact = Column(String(50), nullable=False)
+    customer_address = Column(String(200), nullable=False)
+    merchant_name = Column(String(100), nullable=False, index=True)
+    current_status = Column(String(20), nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivedStatusHistory(Base):
+    __tablename__ = "archived_status_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
+
+    # partitioned tables need the partition key in the primary key
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+    order_id = Column(String(50), nullable=False, index=True)
+    status = Column(String(20), nullable=False)
+    updated_by = Column(String(50), nullable=False)
+    source = Column(String(50), nullable=True)
+
+
+# ---------------- ANALYTICS ----------------
+# One row per status transition, filled incrementally from status_history by
+# analytics.py so duration queries never rescan the full history.
+class TransitionDuration(Base):
+    __tablename__ = "transition_durations"
+    __table_args__ = (
+        Index("ix_transition_durations_day_merchant", "day", "merchant_name"),
+    )
+
+    history_id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(String(50), nullable=False, index=True)
+    merchant_name = Column(String(100), nullable=False)
+    from_status = Column(String(20), nullable=False)
+    to_status = Column(String(20), nullable=False)
+    day = Column(Date, nullable=False)
+    duration_seconds = Column(Float, nullable=False)
+    # time since the order's first status, for end-to-end SLAs like created->delivered
+    since_created_seconds = Column(Float, nullable=False)
+
+
+class AnalyticsWatermark(Base):
+    __tablename__ = "analytics_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    last_history_id = Column(Integer, nullable=False, default=0)